@@ -1,16 +1,23 @@
 import atexit
 import base64
+import dataclasses
 import datetime
 import importlib
 import json
 import logging
+import logging.config
+import math
 import os
-import shutil
 import subprocess
 import traceback
 import urllib
+from dataclasses import dataclass
 
 import falcon
+import numpy as np
+import orjson
+import simdjson
+from falcon.media import BaseHandler
 
 import engine.util as util
 
@@ -19,17 +26,77 @@ from engine.docker_util import (
     docker_init,
     docker_file_push,
     docker_file_pull,
+    docker_file_digests,
     create_docker_container,
     remove_docker_container,
 )
 
 
 log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logging.ini")
-logging.config.fileConfig(log_file_path, disable_existing_loggers=False)
+# Debug logging includes every test case's inputs so it's opt-in via LOVELACE_LOG_LEVEL=DEBUG.
+log_level = os.environ.get("LOVELACE_LOG_LEVEL", "INFO").upper()
+logging.config.fileConfig(
+    log_file_path, defaults={"log_level": log_level}, disable_existing_loggers=False
+)
 logger = logging.getLogger(__name__)
 
-cwd = os.path.dirname(os.path.abspath(__file__))
-os.chdir(cwd)
+# The directory containing the engine's own files. Paths the engine relies on are built from it.
+engine_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Problem modules resolve resources and user generated files relative to the directory the engine
+# was launched from, so we leave the working directory alone and make those files available there.
+work_dir = os.getcwd()
+
+# User code and the files derived from it only live for the duration of a submission so we keep
+# them in shared memory when it's available to avoid touching the disk.
+scratch_dir = "/dev/shm/lovelace" if os.path.isdir("/dev/shm") else engine_dir
+os.makedirs(scratch_dir, exist_ok=True)
+
+# Reused across requests so simdjson can recycle its internal buffers. A document parsed by it is
+# only valid until the next call to parse so only one request should be in flight per process.
+json_parser = simdjson.Parser()
+
+# Problem modules never change while the engine is running so we only import each one once.
+problem_module_cache = {}
+
+# Paths of each cached problem module's static resources, see get_static_resource_paths.
+static_resource_paths = {}
+
+# SHA-256 digests of static resources keyed by path, see static_resource_digest.
+static_resource_digests = {}
+
+# Code runners only hold per-language configuration so one runner per language is shared.
+code_runners = {}
+
+
+@dataclass
+class TestCaseDetails:
+    """
+    The details of a single test case returned to the user. orjson serializes dataclasses natively
+    so the field names are the JSON keys.
+    """
+
+    __slots__ = (
+        "testCaseType",
+        "input",
+        "output",
+        "expected",
+        "inputString",
+        "outputString",
+        "expectedString",
+        "passed",
+        "processInfo",
+    )
+
+    testCaseType: str
+    input: tuple
+    output: tuple
+    expected: object
+    inputString: str
+    outputString: str
+    expectedString: str
+    passed: bool
+    processInfo: dict
 
 
 class SubmitResource:
@@ -59,7 +126,7 @@ class SubmitResource:
             resp_dict = {"error": "No code provided!"}
             resp.status = falcon.HTTP_400
             resp.set_header("Access-Control-Allow-Origin", "*")
-            resp.body = json.dumps(resp_dict)
+            resp.data = json_dumps(resp_dict)
             return
 
         code_filename = write_code_to_file(code, language)
@@ -76,7 +143,13 @@ class SubmitResource:
             )
 
             problems = importlib.import_module("problems")
-            problem = importlib.import_module(problem_module)
+            problem = problem_module_cache.get(problem_module)
+            if problem is None:
+                problem = importlib.import_module(problem_module)
+                static_resource_paths[problem_module] = get_static_resource_paths(
+                    problem_name, problem
+                )
+                problem_module_cache[problem_module] = problem
         except Exception:
             explanation = (
                 "Could not import module {:s}. "
@@ -92,16 +165,13 @@ class SubmitResource:
         function_name = problem.FUNCTION_NAME
         problem_dir = problem_name
 
-        # Copy static resources into engine directory and push them into the Linux container.
+        # Link static resources into the work directory and push them into the Linux container.
         static_resources = []
-        for resource_file_name in problem.STATIC_RESOURCES:
-            from_path = os.path.join(cwd, "..", "resources", problem_dir, resource_file_name)
-            to_path = os.path.join(cwd, resource_file_name)
-
-            logger.debug("Copying static resource from {:s} to {:s}".format(from_path, to_path))
+        for from_path, to_path, container_path in static_resource_paths[problem_module]:
+            logger.debug("Linking static resource from %s to %s", from_path, to_path)
 
             try:
-                shutil.copyfile(from_path, to_path)
+                util.link_or_copy_file(from_path, to_path)
             except Exception:
                 explanation = "Engine failed to copy a static resource. Returning falcon HTTP 500."
                 add_error_to_response(
@@ -111,28 +181,39 @@ class SubmitResource:
 
             static_resources.append(to_path)
 
-            container_path = "/root/{:}".format(resource_file_name)
-            logger.debug(
-                "Pushing static resource to container {:}{:}".format(
-                    self.container_id, container_path
+        # User code runs as root in the same container and may have changed or deleted a static
+        # resource pushed by an earlier submission, so we check what the container actually holds
+        # and only push resources that are missing or different. Hashing them all takes a single
+        # exec instead of a docker cp per resource.
+        if static_resources:
+            container_paths = [paths[2] for paths in static_resource_paths[problem_module]]
+            container_digests = docker_file_digests(self.container_id, container_paths)
+
+            for from_path, _, container_path in static_resource_paths[problem_module]:
+                if container_digests.get(container_path) == static_resource_digest(from_path):
+                    logger.debug(
+                        "Static resource already in container %s%s",
+                        self.container_id,
+                        container_path,
+                    )
+                    continue
+
+                logger.debug(
+                    "Pushing static resource to container %s%s", self.container_id, container_path
                 )
-            )
-            _ = docker_file_push(self.container_id, from_path, container_path)
+                _ = docker_file_push(self.container_id, from_path, container_path)
 
         if not problem.STATIC_RESOURCES:
             logger.debug("No static resources to push")
 
         logger.info("Generating test cases...")
-        test_cases = []
 
         try:
-            for i, test_type in enumerate(problem.TestCaseType):
+            test_cases = []
+            for test_type in problem.TestCaseType:
                 for j in range(test_type.multiplicity):
-                    logger.debug(
-                        "Generating test case {:d}: {:s} ({:d}/{:d})...".format(
-                            len(test_cases) + 1, str(test_type), j + 1, test_type.multiplicity
-                        )
-                    )
+                    logger.debug("Generating test case %d: %s (%d/%d)...",
+                                 len(test_cases) + 1, test_type, j + 1, test_type.multiplicity)
                     test_cases.append(problem.generate_test_case(test_type))
         except Exception:
             explanation = "Engine failed to generate a test case. Returning falcon HTTP 500."
@@ -141,39 +222,48 @@ class SubmitResource:
             )
             return
 
-        # Copy over all the dynamic resources generated by the test cases.
+        # Link over all the dynamic resources generated by the test cases. Several test cases may
+        # share a dynamic resource so each one is only linked and pushed once per submission.
         dynamic_resources = []
+        dynamic_resource_filenames = set()
         for i, tc in enumerate(test_cases):
             if "DYNAMIC_RESOURCES" in tc.input:
                 for dynamic_resource_filename in tc.input["DYNAMIC_RESOURCES"]:
+                    if dynamic_resource_filename in dynamic_resource_filenames:
+                        continue
+                    dynamic_resource_filenames.add(dynamic_resource_filename)
+
                     resource_path = os.path.join(
-                        cwd, "..", "resources", problem_dir, dynamic_resource_filename
+                        engine_dir, "..", "resources", problem_dir, dynamic_resource_filename
                     )
-                    destination_path = os.path.join(cwd, dynamic_resource_filename)
+                    destination_path = os.path.join(work_dir, dynamic_resource_filename)
 
                     logger.debug(
-                        "Copying test case resource from {:s} to {:s}...".format(
-                            resource_path, destination_path
-                        )
+                        "Linking test case resource from %s to %s...",
+                        resource_path,
+                        destination_path,
                     )
 
-                    shutil.copyfile(resource_path, destination_path)
+                    util.link_or_copy_file(resource_path, destination_path)
 
                     dynamic_resources.append(resource_path)
                     dynamic_resources.append(destination_path)
 
                     container_path = "/root/{:}".format(dynamic_resource_filename)
                     logger.debug(
-                        "Pushing dynamic resource to container {:}{:}".format(
-                            self.container_id, container_path
-                        )
+                        "Pushing dynamic resource to container %s%s",
+                        self.container_id,
+                        container_path,
                     )
                     _ = docker_file_push(self.container_id, resource_path, container_path)
 
         if not dynamic_resources:
             logger.debug("No dynamic resources to push")
 
-        runner = CodeRunner(language)
+        runner = code_runners.get(language)
+        if runner is None:
+            runner = CodeRunner(language)
+            code_runners[language] = runner
 
         input_tuples = [tc.input_tuple() for tc in test_cases]
         output_tuples = [tc.output_tuple() for tc in test_cases]
@@ -206,13 +296,15 @@ class SubmitResource:
                     container_filepath = "/root/{:s}".format(user_generated_filename)
 
                     logger.debug(
-                        "Pulling user generated file from container {:s}{:s}".format(
-                            self.container_name, container_filepath
-                        )
+                        "Pulling user generated file from container %s%s",
+                        self.container_name,
+                        container_filepath,
                     )
 
                     _ = docker_file_pull(
-                        self.container_id, container_filepath, user_generated_filename
+                        self.container_id,
+                        container_filepath,
+                        os.path.join(work_dir, user_generated_filename),
                     )
                     files_pulled = True
 
@@ -220,19 +312,15 @@ class SubmitResource:
             logger.debug("No user generated files to pull")
 
         n_cases = len(test_cases)
-        n_passes = 0  # Number of test cases passed.
-        test_case_details = (
-            []
-        )  # List of dicts each containing the details of a particular test case.
+        passes = n_cases * [False]  # Whether each test case passed.
+        test_case_details = n_cases * [None]  # The details of each test case.
 
         # Verify that user outputs are all correct (i.e. check whether each test case passes or fails).
-        for input_tuple, user_output, p_info, tc in zip(
-            input_tuples, user_outputs, p_infos, test_cases
+        for i, (input_tuple, user_output, p_info, tc) in enumerate(
+            zip(input_tuples, user_outputs, p_infos, test_cases)
         ):
             if user_output[0] is None:
-                logger.debug(
-                    "Looks like user's function returned None: output={:}".format(user_output)
-                )
+                logger.debug("Looks like user's function returned None: output=%s", user_output)
                 passed = False
                 expected_output = "Your function returned None. It shouldn't do that."
             else:
@@ -247,28 +335,26 @@ class SubmitResource:
                     )
                     return
 
-            if passed:
-                n_passes += 1
-
-            test_case_details.append(
-                {
-                    "testCaseType": tc.test_type.test_name,
-                    "input": input_tuple,
-                    "output": user_output,
-                    "expected": expected_output,
-                    "inputString": str(input_tuple),
-                    "outputString": str(user_output),
-                    "expectedString": str(expected_output),
-                    "passed": passed,
-                    "processInfo": p_info,
-                }
+            passes[i] = passed
+
+            test_case_details[i] = TestCaseDetails(
+                testCaseType=tc.test_type.test_name,
+                input=input_tuple,
+                output=user_output,
+                expected=expected_output,
+                inputString=str(input_tuple),
+                outputString=str(user_output),
+                expectedString=str(expected_output),
+                passed=passed,
+                processInfo=p_info,
             )
 
             if "DYNAMIC_RESOURCES" in tc.input:
                 for dynamic_resource_path in dynamic_resources:
-                    logger.debug("Deleting dynamic resource: {:s}".format(dynamic_resource_path))
+                    logger.debug("Deleting dynamic resource: %s", dynamic_resource_path)
                     util.delete_file(dynamic_resource_path)
 
+        n_passes = sum(passes)  # Number of test cases passed.
         logger.info("Passed %d/%d test cases.", n_passes, n_cases)
 
         resp_dict = {
@@ -278,33 +364,121 @@ class SubmitResource:
             "testCaseDetails": test_case_details,
         }
 
+        try:
+            resp_body = json_dumps(resp_dict)
+        except (TypeError, ValueError):
+            explanation = (
+                "Engine failed to serialize the test case results. Returning falcon HTTP 500."
+            )
+            add_error_to_response(
+                resp, explanation, traceback.format_exc(), falcon.HTTP_500, code_filename
+            )
+            return
+
         resp.status = falcon.HTTP_200
         resp.set_header("Access-Control-Allow-Origin", "*")
-        resp.body = json.dumps(resp_dict)
+        resp.data = resp_body
 
         util.delete_file(code_filename)
         logger.debug("User code file deleted: {:s}".format(code_filename))
 
         for file_path in static_resources:
-            logging.debug("Deleting static resource {:s}".format(file_path))
+            logger.debug("Deleting static resource %s", file_path)
             util.delete_file(file_path)
 
 
-def parse_payload(http_request):
-    try:
-        raw_payload_data = http_request.stream.read().decode("utf-8")
-    except Exception as ex:
-        logger.error("Bad request, reason unknown. Returning 400.")
-        raise falcon.HTTPError(falcon.HTTP_400, "Error", ex.message)
+def get_static_resource_paths(problem_dir, problem):
+    """
+    Compute where each of a problem's static resources is copied from and to.
+
+    :param problem_dir: the name of the problem's directory in the resources directory
+    :param problem: the problem module
+    :return: a list of (resource path, work directory path, container path) tuples
+    """
+    return [
+        (
+            os.path.join(engine_dir, "..", "resources", problem_dir, resource_file_name),
+            os.path.join(work_dir, resource_file_name),
+            "/root/{:}".format(resource_file_name),
+        )
+        for resource_file_name in problem.STATIC_RESOURCES
+    ]
+
+
+def static_resource_digest(resource_path):
+    """
+    Return the SHA-256 digest of a static resource, only hashing it the first time it's needed as
+    static resources never change while the engine is running.
+
+    :param resource_path: path to the static resource
+    :return: the hex digest of the static resource
+    """
+    digest = static_resource_digests.get(resource_path)
+    if digest is None:
+        digest = util.file_digest(resource_path)
+        static_resource_digests[resource_path] = digest
+    return digest
+
+
+def json_dumps(obj):
+    """
+    Serialize an object to JSON using orjson. Objects orjson refuses to serialize, e.g. integers
+    that don't fit in 64 bits, are serialized with the stdlib json module instead. Both write NaN
+    and infinities as null so the output is always valid JSON.
 
+    :param obj: the object to serialize, possibly containing numpy arrays or scalars
+    :return: UTF-8 encoded JSON bytes
+    """
     try:
-        json_payload = json.loads(raw_payload_data)
-    except ValueError:
-        logger.error("Received invalid JSON: {:}".format(raw_payload_data))
-        logger.error("Returning 400 error.")
-        raise falcon.HTTPError(falcon.HTTP_400, "Invalid JSON", "Could not decode request body.")
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    except orjson.JSONEncodeError:
+        logger.debug("orjson could not serialize the response, falling back to json.")
+        return json.dumps(json_compatible(obj), allow_nan=False).encode("utf-8")
+
+
+def json_compatible(obj):
+    """
+    Recursively convert an object into one the stdlib json module serializes the same way orjson
+    does: dataclasses and numpy values become plain Python objects and NaN or infinite floats
+    become None.
+    """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: json_compatible(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [json_compatible(value) for value in obj]
+    if dataclasses.is_dataclass(obj):
+        return {
+            field.name: json_compatible(getattr(obj, field.name))
+            for field in dataclasses.fields(obj)
+        }
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return json_compatible(obj.tolist())
+    return obj
+
+
+class JSONMediaHandler(BaseHandler):
+    """
+    Falcon media handler that parses request bodies with simdjson and serializes responses with
+    orjson. Both work directly on bytes so, unlike falcon's JSONHandler, the body is never decoded
+    into an intermediate str.
+    """
+
+    def deserialize(self, stream, content_type, content_length):
+        raw_payload_data = stream.read()
+
+        try:
+            return json_parser.parse(raw_payload_data)
+        except ValueError:
+            logger.error("Received invalid JSON: {:}".format(raw_payload_data))
+            logger.error("Returning 400 error.")
+            raise falcon.HTTPError(
+                falcon.HTTP_400, "Invalid JSON", "Could not decode request body."
+            )
 
-    return json_payload
+    def serialize(self, media, content_type):
+        return json_dumps(media)
 
 
 def write_code_to_file(code, language):
@@ -315,9 +489,9 @@ def write_code_to_file(code, language):
     :param language: the code's programming language
     :return: the name of the file containing the user's code
     """
-    decoded_code = str(base64.b64decode(code), "utf-8")
+    decoded_code = base64.b64decode(code)
     extension = {"python": ".py", "javascript": ".js", "julia": ".jl", "c": ".c"}.get(language)
-    code_filename = util.write_str_to_file(decoded_code, extension)
+    code_filename = util.write_bytes_to_file(decoded_code, extension, scratch_dir)
 
     logger.debug("User code saved in: {:s}".format(code_filename))
 
@@ -363,11 +537,16 @@ def add_error_to_response(resp, explanation, tb, falcon_http_error_code, code_fi
 
     resp.status = falcon_http_error_code
     resp.set_header("Access-Control-Allow-Origin", "*")
-    resp.body = json.dumps(resp_dict)
+    resp.data = json_dumps(resp_dict)
     return
 
 
 docker_init()
 app = falcon.API()
+
+json_handler = JSONMediaHandler()
+app.req_options.media_handlers[falcon.MEDIA_JSON] = json_handler
+app.resp_options.media_handlers[falcon.MEDIA_JSON] = json_handler
+
 app.add_route("/submit", SubmitResource())
 app.add_error_handler(Exception, lambda ex, req, resp, params: logger.exception(ex))
@@ -1,11 +1,14 @@
 import fileinput
+import functools
 import json
 import logging
+import os
 import pickle
 import shutil
 import subprocess
 from subprocess import CalledProcessError
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import docker
 import numpy as np
@@ -14,8 +17,16 @@ import engine.util as util
 from engine.docker_util import docker_file_push, docker_file_pull, docker_execute
 
 
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 logger = logging.getLogger(__name__)
 
+# Threads used to copy files out of the docker container concurrently, leaving a couple of
+# cores free for the engine itself. Set LOVELACE_FILE_TRANSFER_THREADS=1 to copy files one by one.
+FILE_TRANSFER_THREADS = int(
+    os.environ.get("LOVELACE_FILE_TRANSFER_THREADS", max(1, (os.cpu_count() or 1) - 2))
+)
+file_transfer_pool = ThreadPoolExecutor(max_workers=FILE_TRANSFER_THREADS)
+
 
 class FilePushError(Exception):
     def __init__(self, message):
@@ -46,6 +57,10 @@ class NumpyEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+# Encoders are stateless so we build one up front instead of on every json.dump call.
+numpy_encoder = NumpyEncoder(separators=(",", ":"))
+
+
 class CodeRunner(AbstractRunner):
     def __init__(self, language):
         self.util_files = []
@@ -68,7 +83,9 @@ class CodeRunner(AbstractRunner):
     def run(self, container_id, code_filename, function_name, input_tuples, correct_output_tuples):
         logger.info("Running {:s} with {:d} inputs...".format(code_filename, len(input_tuples)))
 
-        run_id = code_filename.split(".")[0]
+        # All the files for this run live next to the code file on the engine side, and directly
+        # in /root inside the container.
+        run_id = os.path.splitext(code_filename)[0]
 
         # Pickle all the input tuples into one file.
         if self.file_type == "pickle":
@@ -80,11 +97,11 @@ class CodeRunner(AbstractRunner):
             input_pickle = "{:s}.input.json".format(run_id)
             with open(input_pickle, mode="w") as f:
                 logger.debug("Pickling input tuples in {:s}...".format(input_pickle))
-                json.dump(input_tuples, f, cls=NumpyEncoder)
+                f.write(numpy_encoder.encode(input_tuples))
 
-        # Copy the relevant boilerplate run script into the current working directory.
+        # Copy the relevant boilerplate run script next to the code file.
         runner_file = "{:s}.run.py".format(run_id)
-        shutil.copy(self.run_script_filename, runner_file)
+        shutil.copy(os.path.join(SCRIPT_DIR, self.run_script_filename), runner_file)
 
         # Replace "$FUNCTION_NAME" in the run script with the actual function name to call
         # (as defined in the problem module).
@@ -107,7 +124,7 @@ class CodeRunner(AbstractRunner):
 
         for file_name in required_files + self.util_files:
             source_path = file_name
-            target_path = "/root/{:s}".format(file_name)
+            target_path = "/root/{:s}".format(os.path.basename(file_name))
 
             try:
                 push_stdout = docker_file_push(container_id, source_path, target_path)
@@ -118,7 +135,7 @@ class CodeRunner(AbstractRunner):
                 raise FilePushError()
 
         # Tell the Linux container to execute the run script that will run the user's code.
-        runner_path = "/root/{}".format(runner_file)
+        runner_path = "/root/{}".format(os.path.basename(runner_file))
         command = ["python3", runner_path]
 
         logger.debug("Trying to execute function in docker...")
@@ -140,22 +157,28 @@ class CodeRunner(AbstractRunner):
         process_infos = []
 
         # Read all the output that the user produced.
-        # Each test case's output will end up it one output pickle file.
-        for i, _ in enumerate(input_tuples):
-            output_pickle = "{:s}.output{:d}.pickle".format(run_id, i)
-            source_path = "/root/{:s}".format(output_pickle)
-            target_path = output_pickle
-
-            try:
-                pull_stdout = docker_file_pull(container_id, source_path, target_path)
-            except CalledProcessError:
-                for fn in required_files:
-                    util.delete_file(fn)
-                raise FilePullError(pull_stdout)
+        # Each test case's output will end up it one output pickle file. Every pull is a separate
+        # `docker cp` so we pull them concurrently unless file transfer threads are disabled.
+        output_indices = range(len(input_tuples))
+        pull = functools.partial(pull_output_pickle, container_id, run_id)
 
-            with open(output_pickle, mode="rb") as f:
-                output_dict = pickle.load(f)
+        try:
+            if FILE_TRANSFER_THREADS > 1:
+                futures = [file_transfer_pool.submit(pull, i) for i in output_indices]
+                # Let every pull finish before collecting results so that none of them can still
+                # be writing an output pickle when we clean up after a failed pull.
+                wait(futures)
+                output_dicts = [future.result() for future in futures]
+            else:
+                output_dicts = [pull(i) for i in output_indices]
+        except FilePullError:
+            # Other pulls may have succeeded before one failed, so remove all their output too.
+            output_pickles = [output_pickle_filename(run_id, i) for i in output_indices]
+            for fn in required_files + output_pickles:
+                util.delete_file(fn)
+            raise
 
+        for output_dict in output_dicts:
             # TODO: exec_retval will always be zero here, so why return it?
             p_info = {
                 "return_value": exec_retval,
@@ -168,16 +191,43 @@ class CodeRunner(AbstractRunner):
             process_infos.append(p_info)
 
             logger.debug(
-                "runtime: {:g} s, max_mem_usage: {:g} kB".format(
-                    p_info["runtime"], p_info["max_mem_usage"]
-                )
+                "runtime: %g s, max_mem_usage: %g kB", p_info["runtime"], p_info["max_mem_usage"]
             )
 
-            util.delete_file(output_pickle)
-
         logger.info("Finished running user code.")
 
         for fn in required_files:
             util.delete_file(fn)
 
         return user_outputs, process_infos
+
+
+def output_pickle_filename(run_id, i):
+    """Return the name of the file the run script writes the output of test case i to."""
+    return "{:s}.output{:d}.pickle".format(run_id, i)
+
+
+def pull_output_pickle(container_id, run_id, i):
+    """
+    Pull the output pickle of a single test case out of the container and load it.
+
+    :param container_id: the container the user's code was run in
+    :param run_id: the run ID the output pickle filenames are based on
+    :param i: the index of the test case
+    :return: the output dict written by the run script for this test case
+    """
+    output_pickle = output_pickle_filename(run_id, i)
+    source_path = "/root/{:s}".format(os.path.basename(output_pickle))
+    target_path = output_pickle
+
+    try:
+        docker_file_pull(container_id, source_path, target_path)
+    except CalledProcessError as e:
+        raise FilePullError(e.stdout)
+
+    with open(output_pickle, mode="rb") as f:
+        output_dict = pickle.load(f)
+
+    util.delete_file(output_pickle)
+
+    return output_dict
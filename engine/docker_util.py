@@ -1,11 +1,17 @@
 import logging
 import os
+import re
 import subprocess
 from subprocess import CalledProcessError
 
 import docker
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SHA256_HEX_DIGEST = re.compile("[0-9a-f]{64}")
+SHA256SUM_ESCAPE = re.compile(r"\\[\\nr]")
+SHA256SUM_UNESCAPED = {"\\\\": "\\", "\\n": "\n", "\\r": "\r"}
+
 logger = logging.getLogger(__name__)
 
 
@@ -121,6 +127,36 @@ def docker_file_pull(container_id, src_path, tgt_path):
     return ret.stdout
 
 
+def docker_file_digests(container_id, paths, client=None):
+    """Compute the SHA-256 digests of files in a docker container
+
+    Returns a dict mapping each path to its hex digest. Files that don't exist in the container
+    are left out.
+    """
+
+    exit_code, std_out = docker_execute(container_id, ["sha256sum", "--"] + paths, client=client)
+
+    # sha256sum prints "<digest>  <path>" for every file it could read and an error for the rest.
+    # If a path contains a backslash or newline, the line starts with a backslash and those
+    # characters are escaped in the path.
+    digests = {}
+    for line in std_out.split("\n"):
+        escaped = line.startswith("\\")
+        if escaped:
+            line = line[1:]
+
+        digest, sep, path = line.partition("  ")
+        if not sep or not SHA256_HEX_DIGEST.fullmatch(digest):
+            continue
+
+        if escaped:
+            path = SHA256SUM_ESCAPE.sub(lambda m: SHA256SUM_UNESCAPED[m.group(0)], path)
+
+        digests[path] = digest
+
+    return digests
+
+
 def docker_execute(container_id, cmd, timeout=60, env=None, client=None):
     """Execute a command in a docker container"""
 
@@ -1,4 +1,5 @@
 import os
+import shutil
 import time
 import hashlib
 import logging
@@ -18,8 +19,21 @@ def write_str_to_file(string, extension='', encoding='utf-8'):
     # Convert the code to a byte string.
     blob = string.encode(encoding)
 
+    return write_bytes_to_file(blob, extension)
+
+
+def write_bytes_to_file(blob, extension='', directory=''):
+    """
+    Save the contents of a byte string to a file.
+
+    :param blob: the data to be saved
+    :param extension: the file extension to be used for the file's name
+    :param directory: the directory to save the file in, defaults to the current directory
+    :returns the name of the file containing the data
+    """
+
     # Use the time so that two identical files have different file names
-    time_bytes = bytes(str(time.time()), encoding=encoding)
+    time_bytes = bytes(str(time.time()), encoding='utf-8')
 
     # Hash the byte string to generate a filename.
     m = hashlib.sha1()
@@ -27,10 +41,10 @@ def write_str_to_file(string, extension='', encoding='utf-8'):
     m.update(time_bytes)
     hash_code = m.hexdigest()
 
-    filename = "{}{}".format(hash_code, extension)
+    filename = os.path.join(directory, "{}{}".format(hash_code, extension))
 
-    f = open(filename, 'w')
-    f.write(string)
+    f = open(filename, 'wb')
+    f.write(blob)
     f.close()
 
     return filename
@@ -56,6 +70,41 @@ def read_list_from_file(filename):
     return the_list
 
 
+def link_or_copy_file(src, dst):
+    """
+    Hard link a file to a new path, falling back to copying it if a link cannot be made (e.g. if
+    the paths are on different filesystems).
+
+    :param src: path to the existing file
+    :param dst: path the file should be available at
+    """
+    if os.path.lexists(dst):
+        if os.path.samefile(src, dst):
+            return
+
+        # Never copy through an existing link, it would overwrite the file it links to.
+        os.remove(dst)
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def file_digest(filename):
+    """
+    Compute the SHA-256 digest of a file's contents, as printed by sha256sum.
+
+    :param filename: the file to hash
+    :returns the hex digest of the file
+    """
+    m = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            m.update(chunk)
+    return m.hexdigest()
+
+
 def delete_file(filename):
     if os.path.isfile(filename):
         logger.debug("Deleting file: {:s}".format(filename))
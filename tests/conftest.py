@@ -1,11 +1,15 @@
 import base64
 import json
 import os
+import sys
 import time
 
 import pytest
 import requests
 
+# Make the engine package importable when running pytest from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 
 @pytest.fixture(scope="session")
 def engine_uri():
@@ -0,0 +1,31 @@
+import engine.docker_util as docker_util
+
+
+DATA_DIGEST = "ca978112ca1bbdcafac231b39a23dc4da786eff8147c4e72b9807785afee48bb"
+ESCAPED_DIGEST = "3e23e8160039594a33894f6564e1b1348bbd7a0088d42c4acb73eeaed59c009d"
+
+# Output of sha256sum run in a container, as returned by exec_run with stderr mixed into stdout.
+SHA256SUM_OUTPUT = (
+    DATA_DIGEST + "  /root/data.csv\n"
+    "\\" + ESCAPED_DIGEST + "  /root/back\\\\slash\\nline.txt\n"
+    "sha256sum: /root/missing.txt: No such file or directory\n"
+)
+
+
+def test_docker_file_digests(monkeypatch):
+    paths = ["/root/data.csv", "/root/back\\slash\nline.txt", "/root/missing.txt"]
+
+    def fake_docker_execute(container_id, cmd, client=None):
+        assert container_id == "container"
+        assert cmd == ["sha256sum", "--"] + paths
+        return 1, SHA256SUM_OUTPUT
+
+    monkeypatch.setattr(docker_util, "docker_execute", fake_docker_execute)
+
+    digests = docker_util.docker_file_digests("container", paths)
+
+    assert digests == {
+        "/root/data.csv": DATA_DIGEST,
+        "/root/back\\slash\nline.txt": ESCAPED_DIGEST,
+    }
+    assert "/root/missing.txt" not in digests
@@ -0,0 +1,94 @@
+import errno
+import hashlib
+import os
+
+import pytest
+
+import engine.util as util
+
+
+@pytest.fixture()
+def src_file(tmp_path):
+    src = tmp_path / "src.txt"
+    src.write_text("resource contents")
+    return src
+
+
+def test_link_or_copy_file_links(src_file, tmp_path):
+    dst = tmp_path / "dst.txt"
+    util.link_or_copy_file(str(src_file), str(dst))
+
+    assert os.path.samefile(src_file, dst)
+
+
+def test_link_or_copy_file_existing_link_to_same_file(src_file, tmp_path):
+    dst = tmp_path / "dst.txt"
+    os.link(src_file, dst)
+
+    util.link_or_copy_file(str(src_file), str(dst))
+
+    assert os.path.samefile(src_file, dst)
+    assert dst.read_text() == "resource contents"
+
+
+def test_link_or_copy_file_stale_link_to_other_file(src_file, tmp_path):
+    other = tmp_path / "other.txt"
+    other.write_text("other contents")
+    dst = tmp_path / "dst.txt"
+    os.link(other, dst)
+
+    util.link_or_copy_file(str(src_file), str(dst))
+
+    assert os.path.samefile(src_file, dst)
+    assert other.read_text() == "other contents"
+
+
+def test_link_or_copy_file_copies_across_devices(src_file, tmp_path, monkeypatch):
+    def cross_device_link(src, dst):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(os, "link", cross_device_link)
+
+    other = tmp_path / "other.txt"
+    other.write_text("other contents")
+    dst = tmp_path / "dst.txt"
+    os.symlink(other, dst)
+
+    util.link_or_copy_file(str(src_file), str(dst))
+
+    assert not os.path.islink(dst)
+    assert dst.read_text() == "resource contents"
+    assert other.read_text() == "other contents"
+
+
+def test_write_bytes_to_file(tmp_path):
+    blob = "print('héllo')\n".encode("utf-8")
+    filename = util.write_bytes_to_file(blob, ".py", str(tmp_path))
+
+    assert os.path.dirname(filename) == str(tmp_path)
+    assert filename.endswith(".py")
+    with open(filename, "rb") as f:
+        assert f.read() == blob
+
+
+def test_write_bytes_to_file_current_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    filename = util.write_bytes_to_file(b"\x00\xff not utf-8")
+
+    assert os.path.dirname(filename) == ""
+    assert (tmp_path / filename).read_bytes() == b"\x00\xff not utf-8"
+
+
+def test_write_str_to_file_encodes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    filename = util.write_str_to_file("héllo", ".txt")
+
+    assert (tmp_path / filename).read_bytes() == "héllo".encode("utf-8")
+
+
+def test_file_digest(tmp_path):
+    blob = os.urandom(200000)
+    path = tmp_path / "resource.bin"
+    path.write_bytes(blob)
+
+    assert util.file_digest(str(path)) == hashlib.sha256(blob).hexdigest()